@@ -1,15 +1,25 @@
 import os
+import io
+import csv
 import time
-import json
+import asyncio
 import logging
+import aiofiles
 import httpx
-from fastapi import FastAPI, HTTPException
+import orjson
+from collections import deque
+from fastapi import Depends, FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
+from typing_extensions import TypedDict
+from aiolimiter import AsyncLimiter
 from dotenv import load_dotenv
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import AsyncMongoClient
+from pymongo.errors import BulkWriteError
+from bson.datetime_ms import DatetimeMS
+from datetime import datetime
 
 load_dotenv()
 
@@ -18,13 +28,31 @@ VLLM_API_BASE = os.getenv("VLLM_API_BASE", "http://localhost:8000/v1")
 MODEL_NAME = os.getenv("MODEL_NAME", "llama-2-7b-chat")
 PORT = int(os.getenv("PORT", "8001"))
 
+# Coalesce SSE events from the same upstream read into one write to the client
+STREAM_FLUSH_BYTES = 4096
+
+# Cap on concurrent upstream vLLM streams, adapted (AIMD) on time to first token.
+# TTFT tracks vLLM queueing/prefill load; total stream time mostly tracks output length.
+MAX_CONCURRENCY = int(os.getenv("MAX_CONCURRENCY", "32"))
+MIN_CONCURRENCY = int(os.getenv("MIN_CONCURRENCY", "4"))
+TARGET_TTFT_MS = float(os.getenv("TARGET_TTFT_MS", "2000"))
+LATENCY_WINDOW = int(os.getenv("LATENCY_WINDOW", "20"))
+
+# Per-client-IP request rate limit for /api/chat (0 disables)
+RATE_LIMIT_RPM = int(os.getenv("RATE_LIMIT_RPM", "120"))
+RATE_LIMIT_TTL = 600  # seconds before an idle client's limiter is dropped
+
 # Optional MongoDB configuration for storing remote messages
 MONGODB_URI = os.getenv("MONGODB_URI")
 MONGODB_DB = os.getenv("MONGODB_DB", "webllm")
 MONGODB_COLLECTION = os.getenv("MONGODB_COLLECTION", "remote_messages")
 MONGODB_BENCHMARKS_COLLECTION = os.getenv("MONGODB_BENCHMARKS_COLLECTION", "benchmarks")
 
-mongo_client = AsyncIOMotorClient(MONGODB_URI) if MONGODB_URI else None
+# Chat and benchmark documents are coalesced into one insert_many per window
+MONGO_FLUSH_BATCH = 50
+MONGO_FLUSH_INTERVAL = 0.2  # seconds
+
+mongo_client = AsyncMongoClient(MONGODB_URI) if MONGODB_URI else None
 mongo_db = mongo_client[MONGODB_DB] if mongo_client is not None else None
 mongo_collection = mongo_db[MONGODB_COLLECTION] if mongo_db is not None else None
 benchmarks_collection = mongo_db[MONGODB_BENCHMARKS_COLLECTION] if mongo_db is not None else None
@@ -43,56 +71,365 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-class Message(BaseModel):
+@app.on_event("startup")
+async def startup():
+    # Shared upstream client so vLLM connections are pooled across requests
+    app.state.client = httpx.AsyncClient(
+        base_url=VLLM_API_BASE,
+        http2=True,
+        timeout=httpx.Timeout(60.0, connect=5.0),
+        limits=httpx.Limits(max_connections=256, max_keepalive_connections=128),
+    )
+
+@app.on_event("shutdown")
+async def shutdown():
+    await app.state.client.aclose()
+
+async def collect_batch(queue: asyncio.Queue, batch: list, max_items: int, interval: float):
+    """Wait for one queued item, then keep collecting until max_items or interval elapses."""
+    loop = asyncio.get_running_loop()
+    batch.append(await queue.get())
+    deadline = loop.time() + interval
+    while len(batch) < max_items:
+        timeout = deadline - loop.time()
+        if timeout <= 0:
+            break
+        # asyncio.wait rather than wait_for: before Python 3.12, wait_for can swallow a
+        # cancellation that races with get() completing, and shutdown then hangs
+        getter = asyncio.ensure_future(queue.get())
+        try:
+            await asyncio.wait({getter}, timeout=timeout)
+        finally:
+            if getter.done() and not getter.cancelled():
+                batch.append(getter.result())
+            else:
+                getter.cancel()
+        if not getter.done() or getter.cancelled():
+            break
+
+async def write_mongo_batch(items: list):
+    """Insert queued (collection, docs, future) items with one insert_many per collection.
+
+    Items are removed from `items` once their collection's insert has finished, so
+    a write interrupted by shutdown can be retried with whatever is left.
+    """
+    while items:
+        collection = items[0][0]
+        docs, waiters = [], []
+        for item_collection, item_docs, fut in items:
+            if item_collection.name == collection.name:
+                if fut is not None:
+                    waiters.append((fut, len(docs), len(item_docs)))
+                docs.extend(item_docs)
+
+        error = None
+        failed = set()
+        try:
+            await collection.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            # Unordered: everything except the reported indexes was inserted
+            error = e
+            failed = {err["index"] for err in e.details.get("writeErrors", [])}
+            logger.exception("Failed to write %d of %d documents to MongoDB", len(failed), len(docs))
+        except Exception as e:
+            error = e
+            failed = set(range(len(docs)))
+            logger.exception("Failed to write %d documents to MongoDB", len(docs))
+        items[:] = [item for item in items if item[0].name != collection.name]
+
+        for fut, start, count in waiters:
+            if fut.done():
+                continue
+            failed_count = sum(1 for index in range(start, start + count) if index in failed)
+            if count and failed_count == count:
+                fut.set_exception(error)
+            else:
+                fut.set_result(count - failed_count)
+
+async def mongo_flusher(queue: asyncio.Queue):
+    """Drain queued MongoDB writes in batches."""
+    batch = []
+    try:
+        while True:
+            await collect_batch(queue, batch, MONGO_FLUSH_BATCH, MONGO_FLUSH_INTERVAL)
+            await write_mongo_batch(batch)
+    finally:
+        # Flush whatever is still pending when the app shuts down, including a
+        # batch whose write was interrupted
+        while not queue.empty():
+            batch.append(queue.get_nowait())
+        if batch:
+            await write_mongo_batch(batch)
+
+async def ensure_mongo_indexes():
+    """Create the indexes both history endpoints sort on (newest-first)."""
+    try:
+        await mongo_collection.create_index([("timestamp", -1)])
+        await benchmarks_collection.create_index([("createdAt", -1)])
+    except Exception:
+        logger.exception("Failed to create MongoDB indexes")
+
+@app.on_event("startup")
+async def start_mongo_flusher():
+    app.state.mongo_write_queue = None
+    app.state.mongo_task = None
+    app.state.mongo_index_task = None
+    if mongo_db is None:
+        return
+    app.state.mongo_write_queue = asyncio.Queue()
+    app.state.mongo_task = asyncio.create_task(mongo_flusher(app.state.mongo_write_queue))
+    # In the background so an unreachable MongoDB doesn't delay startup
+    app.state.mongo_index_task = asyncio.create_task(ensure_mongo_indexes())
+
+@app.on_event("shutdown")
+async def stop_mongo_flusher():
+    if app.state.mongo_task is None:
+        return
+    app.state.mongo_index_task.cancel()
+    app.state.mongo_task.cancel()
+    try:
+        await app.state.mongo_task
+    except asyncio.CancelledError:
+        pass
+    # Close only after the final flush has used the client
+    await mongo_client.close()
+
+class Message(TypedDict):
     role: str
     content: str
 
 class ChatRequest(BaseModel):
+    # TypedDict messages are validated by pydantic-core and stay plain dicts for vLLM
     messages: List[Message]
     stream: bool = True
     max_tokens: Optional[int] = 1024
     temperature: Optional[float] = 0.7
 
-import csv
-from datetime import datetime
-
-# ... existing imports ...
-
 # Metrics logging
 METRICS_DIR = os.getenv("METRICS_DIR", "/app/metrics")
 METRICS_FILE = os.path.join(METRICS_DIR, "benchmark_metrics.csv")
 
+METRICS_FLUSH_ROWS = 50
+METRICS_FLUSH_INTERVAL = 0.5  # seconds
+
+METRICS_HEADER = ["timestamp", "ttft_ms", "total_latency_ms", "approx_tokens"]
+
+def format_csv_rows(rows: list) -> str:
+    """Render rows as CSV text so the file write itself can be awaited."""
+    out = io.StringIO()
+    csv.writer(out).writerows(rows)
+    return out.getvalue()
+
+async def metrics_writer(queue: asyncio.Queue, f):
+    """Drain queued metric rows into the already-open CSV file in batches."""
+    rows = []
+    try:
+        while True:
+            await collect_batch(queue, rows, METRICS_FLUSH_ROWS, METRICS_FLUSH_INTERVAL)
+            text = format_csv_rows(rows)
+            rows.clear()
+            try:
+                await f.write(text)
+                await f.flush()
+            except Exception:
+                logger.exception("Failed to write metrics")
+    finally:
+        # Write whatever is still pending when the app shuts down
+        while not queue.empty():
+            rows.append(queue.get_nowait())
+        try:
+            if rows:
+                await f.write(format_csv_rows(rows))
+        finally:
+            await f.close()
+
+@app.on_event("startup")
+async def start_metrics_writer():
+    app.state.metrics_queue = None
+    app.state.metrics_task = None
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        if not os.path.isfile(METRICS_FILE):
+            async with aiofiles.open(METRICS_FILE, mode='w', newline='') as f:
+                await f.write(format_csv_rows([METRICS_HEADER]))
+        # Opened here so an unwritable file disables metrics instead of killing the writer task
+        f = await aiofiles.open(METRICS_FILE, mode='a', newline='')
+    except Exception:
+        logger.exception("Metrics logging disabled, cannot prepare %s", METRICS_FILE)
+        return
+    app.state.metrics_queue = asyncio.Queue()
+    app.state.metrics_task = asyncio.create_task(metrics_writer(app.state.metrics_queue, f))
+
+@app.on_event("shutdown")
+async def stop_metrics_writer():
+    if app.state.metrics_task is None:
+        return
+    app.state.metrics_task.cancel()
+    try:
+        await app.state.metrics_task
+    except asyncio.CancelledError:
+        pass
+
 def log_metrics(ttft_ms: float, total_latency_ms: float, tokens: int = 0):
-    """Log metrics to a CSV file."""
-    # Ensure metrics directory exists
-    os.makedirs(METRICS_DIR, exist_ok=True)
-    
-    file_exists = os.path.isfile(METRICS_FILE)
+    """Queue a metrics row (timestamp in epoch milliseconds) for the background CSV writer."""
+    if app.state.metrics_queue is None:
+        return
+    app.state.metrics_queue.put_nowait(
+        [int(time.time() * 1000), f"{ttft_ms:.2f}", f"{total_latency_ms:.2f}", tokens]
+    )
+
+class AdaptiveLimiter:
+    """Async context manager capping in-flight upstream streams.
+
+    The cap starts at max_limit. After every `window` completions it is halved
+    if mean latency exceeded the target, otherwise raised by one. Upstream
+    overload responses halve it immediately via backoff().
+
+    Entering returns the time.time() at which the slot was acquired, so callers
+    can record latency without the time spent queued here.
+    """
+
+    def __init__(self, max_limit: int, min_limit: int, target_ms: float, window: int):
+        self.max_limit = max_limit
+        self.min_limit = min(min_limit, max_limit)
+        self.limit = max_limit
+        self.target_ms = target_ms
+        self.in_flight = 0
+        self._samples = deque(maxlen=window)
+        self._waiters = deque()
+
+    async def __aenter__(self):
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            return time.time()
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # A slot was handed over just as we were cancelled
+                self._release()
+            elif fut in self._waiters:
+                # _wake() may already have discarded the cancelled future
+                self._waiters.remove(fut)
+            raise
+        return time.time()
+
+    async def __aexit__(self, *exc):
+        self._release()
+
+    def _release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self):
+        while self._waiters and self.in_flight < self.limit:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                self.in_flight += 1
+                fut.set_result(None)
+
+    def _set_limit(self, limit: int):
+        limit = max(self.min_limit, min(self.max_limit, limit))
+        if limit != self.limit:
+            logger.info(f"Upstream concurrency limit {self.limit} -> {limit}")
+            self.limit = limit
+            self._wake()
+
+    def record(self, latency_ms: float):
+        """Record a completed stream and adjust the cap once per full window."""
+        self._samples.append(latency_ms)
+        if len(self._samples) < self._samples.maxlen:
+            return
+        mean = sum(self._samples) / len(self._samples)
+        self._samples.clear()
+        if mean > self.target_ms:
+            self._set_limit(self.limit // 2)
+        else:
+            self._set_limit(self.limit + 1)
+
+    def backoff(self):
+        """Multiplicative decrease on upstream overload signals."""
+        self._samples.clear()
+        self._set_limit(self.limit // 2)
+
+upstream_limiter = AdaptiveLimiter(MAX_CONCURRENCY, MIN_CONCURRENCY, TARGET_TTFT_MS, LATENCY_WINDOW)
+
+async def iter_sse_events(response: httpx.Response):
+    """Yield the complete SSE events (without blank-line terminators) of each upstream read.
+
+    One list is yielded per read, so callers can flush at read boundaries.
+    """
+    pending = b""
+    async for raw in response.aiter_bytes():
+        # One split per read; the trailing piece is an incomplete event
+        parts = (pending + raw).split(b"\n\n")
+        pending = parts.pop()
+        events = [event for event in parts if event]
+        if events:
+            yield events
+    if pending.strip():
+        yield [pending]
+
+_client_limiters: Dict[str, Tuple[AsyncLimiter, float]] = {}
+_limiters_pruned_at = 0.0
+
+async def rate_limit(request: Request):
+    """Reject clients exceeding RATE_LIMIT_RPM before any upstream work is done."""
+    global _limiters_pruned_at
+    if RATE_LIMIT_RPM <= 0:
+        return
+    now = time.monotonic()
+    if now - _limiters_pruned_at > RATE_LIMIT_TTL:
+        for ip, (_, seen) in list(_client_limiters.items()):
+            if now - seen > RATE_LIMIT_TTL:
+                del _client_limiters[ip]
+        _limiters_pruned_at = now
+
+    ip = request.client.host if request.client else "unknown"
+    limiter = _client_limiters[ip][0] if ip in _client_limiters else AsyncLimiter(RATE_LIMIT_RPM, 60)
+    _client_limiters[ip] = (limiter, now)
+    if not limiter.has_capacity():
+        raise HTTPException(
+            status_code=429,
+            detail="Rate limit exceeded",
+            headers={"Retry-After": str(max(1, round(60 / RATE_LIMIT_RPM)))},
+        )
+    await limiter.acquire()
+
+def upstream_tokens_low(response: httpx.Response) -> bool:
+    """True when vLLM reports less than 10% of its token rate limit remaining."""
+    remaining = response.headers.get("x-ratelimit-remaining-tokens")
+    limit = response.headers.get("x-ratelimit-limit-tokens")
     try:
-        with open(METRICS_FILE, mode='a', newline='') as f:
-            writer = csv.writer(f)
-            if not file_exists:
-                writer.writerow(["timestamp", "ttft_ms", "total_latency_ms", "approx_tokens"])
-            writer.writerow([datetime.now().isoformat(), f"{ttft_ms:.2f}", f"{total_latency_ms:.2f}", tokens])
-    except Exception as e:
-        logger.error(f"Failed to write metrics: {e}")
+        return remaining is not None and limit is not None and int(remaining) < 0.1 * int(limit)
+    except ValueError:
+        return False
+
+# Fields shared by every upstream chat completion request
+_PAYLOAD_BASE = {"model": MODEL_NAME, "stream": True}
+
+# SSE framing markers matched against raw upstream events
+_DATA_PREFIX = b"data: "
+_DONE = b"[DONE]"
 
-@app.post("/api/chat")
+@app.post("/api/chat", dependencies=[Depends(rate_limit)])
 async def chat_proxy(request: ChatRequest):
     start_time = time.time()
     logger.info(f"Received chat request. VLLM Target: {VLLM_API_BASE}")
     
     # Log the messages being sent for debugging
-    messages = [m.dict() for m in request.messages]
-    logger.info(f"Messages count: {len(messages)}")
-    for i, msg in enumerate(messages):
-        logger.info(f"  [{i}] {msg.get('role', 'unknown')}: {msg.get('content', '')[:50]}...")
+    messages = request.messages
+    logger.info("Messages count: %d", len(messages))
+    if logger.isEnabledFor(logging.DEBUG):
+        for i, msg in enumerate(messages):
+            logger.debug("  [%d] %s: %.50s...", i, msg.get('role', 'unknown'), msg.get('content', ''))
 
     # Prepare payload for vLLM (OpenAI compatible endpoint)
     payload = {
-        "model": MODEL_NAME,
+        **_PAYLOAD_BASE,
         "messages": messages,
-        "stream": True,
         "max_tokens": request.max_tokens,
         "temperature": request.temperature,
     }
@@ -103,56 +440,80 @@ async def chat_proxy(request: ChatRequest):
         token_count = 0
         ttft = 0.0
         assistant_text = ""
+        buf = bytearray()
+        # The first frame carrying content is flushed straight away so TTFT is unaffected
+        seen_content = False
+        # Deltas are only parsed to rebuild the reply for MongoDB
+        persist = mongo_collection is not None
         
         try:
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                async with client.stream(
-                    "POST", 
-                    f"{VLLM_API_BASE}/chat/completions", 
-                    json=payload,
-                    headers={"Content-Type": "application/json"}
-                ) as response:
-                    
-                    if response.status_code != 200:
-                        error_body = await response.aread()
-                        logger.error(f"Upstream error {response.status_code}: {error_body.decode()}")
-                        yield f"data: {json.dumps({'error': f'Upstream error: {response.status_code}'})}\n\n"
-                        return
-
-                    async for chunk in response.aiter_lines():
-                        if chunk:
-                            if chunk.startswith("data: "):
-                                # Capture first token timing
-                                if first_token_time is None:
-                                    first_token_time = time.time()
-                                    ttft = (first_token_time - start_time) * 1000
-                                    logger.info(f"Time to first token: {ttft:.2f}ms")
-                                
-                                data = chunk[len("data: ") :].strip()
-
-                                # Skip done signals
-                                if data == "[DONE]":
-                                    pass
-                                else:
-                                    # Rough token counting
-                                    token_count += 1
-                                    # Accumulate assistant text for persistence
+            async with upstream_limiter as acquired_at, app.state.client.stream(
+                "POST",
+                "/chat/completions",
+                json=payload,
+            ) as response:
+                
+                if response.status_code != 200:
+                    if response.status_code == 429 or response.status_code >= 500:
+                        upstream_limiter.backoff()
+                    error_body = await response.aread()
+                    logger.error(f"Upstream error {response.status_code}: {error_body.decode()}")
+                    yield b"data: " + orjson.dumps({'error': f'Upstream error: {response.status_code}'}) + b"\n\n"
+                    return
+
+                # Shrink concurrency ahead of upstream throttling
+                if upstream_tokens_low(response):
+                    upstream_limiter.backoff()
+
+                async for events in iter_sse_events(response):
+                    for event in events:
+                        content_piece = None
+                        if event.startswith(_DATA_PREFIX):
+                            # Capture first token timing
+                            if first_token_time is None:
+                                first_token_time = time.time()
+                                ttft = (first_token_time - start_time) * 1000
+                                logger.info(f"Time to first token: {ttft:.2f}ms")
+
+                            data = event[6:].rstrip(b"\r\n ")
+
+                            # Skip done signals
+                            if data == _DONE:
+                                pass
+                            else:
+                                # Rough token counting
+                                token_count += 1
+                                # Accumulate assistant text for persistence
+                                if persist or not seen_content:
                                     try:
-                                        parsed = json.loads(data)
-                                        delta = (
-                                            parsed.get("choices", [{}])[0]
-                                            .get("delta", {})
-                                        )
-                                        content_piece = delta.get("content", "")
-                                        if content_piece:
-                                            assistant_text += content_piece
-                                    except Exception:
-                                        # Ignore JSON parse errors and keep streaming
+                                        choices = orjson.loads(data).get("choices")
+                                        if choices:
+                                            piece = choices[0].get("delta", {}).get("content")
+                                            if isinstance(piece, str):
+                                                content_piece = piece
+                                    except (ValueError, KeyError, TypeError, AttributeError):
+                                        # Ignore malformed frames and keep streaming
                                         pass
-                            
-                            yield f"{chunk}\n"
+                                if content_piece and persist:
+                                    assistant_text += content_piece
+
+                        buf += event + b"\n\n"
+                        first_content = bool(content_piece) and not seen_content
+                        if first_content:
+                            seen_content = True
+                        if first_content or len(buf) >= STREAM_FLUSH_BYTES:
+                            yield bytes(buf)
+                            buf.clear()
+
+                    # Events from the same read are coalesced; nothing waits on the next read
+                    if buf:
+                        yield bytes(buf)
+                        buf.clear()
 
             total_time = (time.time() - start_time) * 1000
+            # TTFT from slot acquisition, so limiter queueing doesn't feed back into the cap
+            if first_token_time is not None:
+                upstream_limiter.record((first_token_time - acquired_at) * 1000)
             tokens_per_sec = token_count / (total_time / 1000) if total_time > 0 else 0
             logger.info(f"Request completed. Total latency: {total_time:.2f}ms. Tokens: ~{token_count}")
             
@@ -160,7 +521,7 @@ async def chat_proxy(request: ChatRequest):
             log_metrics(ttft, total_time, token_count)
 
             # After streaming completes, persist full conversation including the model response with metrics
-            if mongo_collection is not None:
+            if persist:
                 try:
                     full_messages = list(messages)
                     if assistant_text:
@@ -178,22 +539,30 @@ async def chat_proxy(request: ChatRequest):
                             }
                         ]
 
-                    await mongo_collection.insert_one(
-                        {
-                            "timestamp": datetime.utcnow(),
-                            "model": MODEL_NAME,
-                            "messages": full_messages,
-                            "source": "remote",
-                        }
-                    )
-                except Exception as e:
-                    logger.error(f"Failed to write chat to MongoDB: {e}")
+                    doc = {
+                        "timestamp": DatetimeMS(int(time.time() * 1000)),
+                        "model": MODEL_NAME,
+                        "messages": full_messages,
+                        "source": "remote",
+                    }
+                    app.state.mongo_write_queue.put_nowait((mongo_collection, [doc], None))
+                except Exception:
+                    logger.exception("Failed to queue chat for MongoDB")
 
         except Exception as e:
-            logger.error(f"Stream error: {str(e)}")
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
-
-    return StreamingResponse(stream_generator(), media_type="text/event-stream")
+            logger.exception("Stream error")
+            # Frames already received are still in the coalescing buffer; send them first
+            if buf:
+                yield bytes(buf)
+                buf.clear()
+            yield b"data: " + orjson.dumps({'error': str(e)}) + b"\n\n"
+
+    # The generator yields pre-framed bytes; ask proxies not to buffer the stream
+    return StreamingResponse(
+        stream_generator(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.get("/api/chat/history")
 async def get_chat_history(limit: int = 50):
@@ -204,33 +573,44 @@ async def get_chat_history(limit: int = 50):
     try:
         # Fetch the most recent chat sessions
         # Each document contains a full conversation (messages array)
-        cursor = mongo_collection.find().sort("timestamp", -1).limit(limit)
+        # Only the fields the UI needs; batch_size=limit fetches it in one round-trip
+        projection = {
+            "_id": 0,
+            "messages.role": 1,
+            "messages.content": 1,
+            "messages.metrics": 1,
+            "timestamp": 1,
+        }
+        cursor = (
+            mongo_collection.find({}, projection, batch_size=limit)
+            .sort("timestamp", -1)
+            .limit(limit)
+        )
         chats = await cursor.to_list(length=limit)
+        # Oldest first for conversation flow
+        chats.reverse()
         
         # Flatten all messages from all chats into a single list
         # Filter out system messages so they don't appear in the UI
+        now_iso = datetime.utcnow().isoformat()
         all_messages = []
         for chat in chats:
-            chat_messages = chat.get("messages", [])
-            # Add metadata from the chat document, excluding system messages
-            for msg in chat_messages:
-                if msg.get("role") != "system":
-                    message_data = {
-                        "role": msg.get("role"),
-                        "content": msg.get("content"),
-                        "timestamp": chat.get("timestamp").isoformat() if chat.get("timestamp") else datetime.utcnow().isoformat(),
-                    }
+            ts = chat["timestamp"].isoformat() if chat.get("timestamp") else now_iso
+            all_messages.extend(
+                {
+                    "role": msg.get("role"),
+                    "content": msg.get("content"),
+                    "timestamp": ts,
                     # Include metrics if they exist (for assistant messages)
-                    if msg.get("metrics"):
-                        message_data["metrics"] = msg.get("metrics")
-                    all_messages.append(message_data)
-        
-        # Sort by timestamp (oldest first for conversation flow)
-        all_messages.sort(key=lambda x: x.get("timestamp", ""))
+                    **({"metrics": msg["metrics"]} if msg.get("metrics") else {}),
+                }
+                for msg in chat.get("messages", [])
+                if msg.get("role") != "system"
+            )
         
         return {"messages": all_messages}
     except Exception as e:
-        logger.error(f"Failed to retrieve chat history: {e}")
+        logger.exception("Failed to retrieve chat history")
         return {"messages": [], "error": str(e)}
 
 @app.delete("/api/chat/history")
@@ -244,7 +624,7 @@ async def clear_chat_history():
         logger.info(f"Cleared {result.deleted_count} chat documents from MongoDB")
         return {"deleted_count": result.deleted_count, "message": "All chat history cleared"}
     except Exception as e:
-        logger.error(f"Failed to clear chat history: {e}")
+        logger.exception("Failed to clear chat history")
         return {"error": str(e)}
 
 # ============== Benchmark API Endpoints ==============
@@ -276,16 +656,19 @@ async def save_benchmark_results(batch: BenchmarkBatch):
                 "metrics": r.metrics,
                 "timestamp": r.timestamp,
                 "modelName": r.modelName,
-                "createdAt": datetime.utcnow(),
+                "createdAt": DatetimeMS(int(time.time() * 1000)),
             })
         
         if docs:
-            result = await benchmarks_collection.insert_many(docs)
-            logger.info(f"Saved {len(result.inserted_ids)} benchmark results to MongoDB")
-            return {"saved": len(result.inserted_ids)}
+            # Coalesced with other pending writes; resolves once this batch is inserted
+            saved = asyncio.get_running_loop().create_future()
+            app.state.mongo_write_queue.put_nowait((benchmarks_collection, docs, saved))
+            count = await saved
+            logger.info(f"Saved {count} benchmark results to MongoDB")
+            return {"saved": count}
         return {"saved": 0}
     except Exception as e:
-        logger.error(f"Failed to save benchmark results: {e}")
+        logger.exception("Failed to save benchmark results")
         return {"error": str(e), "saved": 0}
 
 @app.get("/api/benchmarks")
@@ -295,7 +678,16 @@ async def get_benchmark_results(limit: int = 200):
         return {"results": [], "error": "MongoDB not configured"}
     
     try:
-        cursor = benchmarks_collection.find().sort("createdAt", -1).limit(limit)
+        projection = {
+            "_id": 0,
+            "promptId": 1,
+            "promptType": 1,
+            "mode": 1,
+            "metrics": 1,
+            "timestamp": 1,
+            "modelName": 1,
+        }
+        cursor = benchmarks_collection.find({}, projection, batch_size=limit).sort("createdAt", -1).limit(limit)
         docs = await cursor.to_list(length=limit)
         
         results = []
@@ -309,12 +701,12 @@ async def get_benchmark_results(limit: int = 200):
                 "modelName": doc.get("modelName"),
             })
         
-        # Sort oldest first for display
-        results.sort(key=lambda x: x.get("timestamp", ""))
+        # Oldest first for display
+        results.reverse()
         
         return {"results": results}
     except Exception as e:
-        logger.error(f"Failed to retrieve benchmark results: {e}")
+        logger.exception("Failed to retrieve benchmark results")
         return {"results": [], "error": str(e)}
 
 @app.delete("/api/benchmarks")
@@ -328,7 +720,7 @@ async def clear_benchmark_results():
         logger.info(f"Cleared {result.deleted_count} benchmark results from MongoDB")
         return {"deleted_count": result.deleted_count, "message": "All benchmark results cleared"}
     except Exception as e:
-        logger.error(f"Failed to clear benchmark results: {e}")
+        logger.exception("Failed to clear benchmark results")
         return {"error": str(e)}
 
 @app.get("/health")
@@ -337,4 +729,6 @@ def health_check():
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=PORT)
+    # Single worker: rate limits, the upstream concurrency limiter and the metrics
+    # writer all keep per-process state
+    uvicorn.run(app, host="0.0.0.0", port=PORT, loop="uvloop", http="httptools")